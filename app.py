@@ -12,13 +12,33 @@ import io
 import zipfile
 import os
 from datetime import datetime
+from typing import Tuple
 
 # Import label generation functions
 from generate_label2 import (
     generate_label2_from_dataframe as generate_label2,
+    split_template,
+    read_label_data,
+    default_pdf_workers,
     HAS_CAIROSVG
 )
 
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@st.cache_resource
+def _load_template(path: str) -> Tuple[str, ...]:
+    """Read an SVG template and split it on its placeholders, cached per path."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return split_template(f.read())
+
+
+@st.cache_data(show_spinner=False)
+def _read_excel_cached(data: bytes) -> pd.DataFrame:
+    """Parse uploaded Excel bytes, cached by file content across reruns."""
+    return read_label_data(io.BytesIO(data))
+
+
 # Page configuration
 st.set_page_config(
     page_title="Label Generator",
@@ -81,18 +101,15 @@ if config["generator"] is None:
     st.stop()
 
 # Get template path
-script_dir = os.path.dirname(os.path.abspath(__file__))
-template_path = os.path.join(script_dir, 'template', config["template"])
+template_path = os.path.join(SCRIPT_DIR, 'template', config["template"])
 
-# Check if template exists
-if not os.path.exists(template_path):
+# Load template (read and split once, then reused across reruns)
+try:
+    template_parts = _load_template(template_path)
+except FileNotFoundError:
     st.error(f"❌ Template file not found: {template_path}")
     st.stop()
 
-# Load template
-with open(template_path, 'r', encoding='utf-8') as f:
-    template_content = f.read()
-
 # File uploader
 st.subheader("📁 Upload Data File")
 uploaded_file = st.file_uploader(
@@ -104,7 +121,7 @@ uploaded_file = st.file_uploader(
 if uploaded_file is not None:
     # Read and preview data
     try:
-        df = pd.read_excel(uploaded_file)
+        df = _read_excel_cached(uploaded_file.getvalue())
         
         st.success(f"✅ File loaded: {uploaded_file.name} ({len(df)} rows)")
         
@@ -112,9 +129,11 @@ if uploaded_file is not None:
         if st.button("🚀 Generate Labels", type="primary", use_container_width=True):
             with st.spinner("Generating labels..."):
                 # Generate labels in memory (PDF only)
+                # The server is long-running, so render PDFs in a worker pool
                 pdf_files, warnings = config["generator"](
-                    template_content, 
-                    df
+                    template_parts, 
+                    df,
+                    pdf_workers=default_pdf_workers()
                 )
                 
                 # Display warnings if any
@@ -128,12 +147,11 @@ if uploaded_file is not None:
                 else:
                     # Create zip file in memory
                     zip_buffer = io.BytesIO()
-                    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+                    # PDFs are already compressed internally, so store them as-is
+                    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_STORED) as zf:
                         # Add PDF files
                         for filename, content in pdf_files:
-                            zf.writestr(filename, content)
-                    
-                    zip_buffer.seek(0)
+                            zf.writestr(filename, content, compress_type=zipfile.ZIP_STORED)
                     
                     # Show success message
                     st.success(f"✅ Generated {len(pdf_files)} PDF labels!")
@@ -144,6 +162,8 @@ if uploaded_file is not None:
                     
                     st.download_button(
                         label="📥 Download All Labels (ZIP)",
+                        # getvalue() hands back the BytesIO's own buffer when it can,
+                        # without copying; st.download_button does not accept memoryviews
                         data=zip_buffer.getvalue(),
                         file_name=zip_filename,
                         mime="application/zip",
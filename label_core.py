@@ -0,0 +1,583 @@
+#!/usr/bin/env python3
+"""
+Label Generator - Shared Core
+Generates SVG and PDF labels from template and Excel data.
+
+This module contains the label generation functions shared by every label
+type. Per-label modules (e.g. generate_label2) are thin wrappers around
+generate_from_dataframe that can be called from both CLI and Streamlit.
+"""
+
+import atexit
+import os
+import re
+import io
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pandas as pd
+from xml.sax.saxutils import escape as _xml_escape
+from typing import Dict, List, Tuple, Optional, Sequence, Union
+
+# Configure fontconfig to use local font folder before importing cairosvg
+# This ensures the Avenir Next Condensed font is available even when not installed system-wide
+def _configure_fontconfig():
+    """Configure fontconfig to include the project's font directory."""
+    import subprocess
+    import tempfile
+    
+    # Get the directory where this script is located
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    font_dir = os.path.join(script_dir, 'font')
+    
+    if not os.path.exists(font_dir):
+        return
+    
+    fonts_conf_path = os.path.join(font_dir, 'fonts.conf')
+    
+    # Already configured, e.g. in a PDF worker process that inherited the
+    # environment: don't rewrite fonts.conf while sibling workers read it
+    if os.environ.get('FONTCONFIG_FILE') == fonts_conf_path:
+        return
+    
+    # Create a comprehensive fonts.conf that includes both custom and system fonts
+    fonts_conf_content = f'''<?xml version="1.0"?>
+<!DOCTYPE fontconfig SYSTEM "urn:fontconfig:fonts.dtd">
+<fontconfig>
+    <!-- Include default system configuration -->
+    <include ignore_missing="yes">/etc/fonts/fonts.conf</include>
+    <include ignore_missing="yes">/etc/fonts/conf.d</include>
+    <include ignore_missing="yes">/usr/share/fonts</include>
+    <include ignore_missing="yes">/usr/local/share/fonts</include>
+    
+    <!-- Add project's custom font directory -->
+    <dir>{font_dir}</dir>
+    
+    <!-- Cache directory -->
+    <cachedir prefix="xdg">fontconfig</cachedir>
+    <cachedir>/tmp/fontconfig-cache</cachedir>
+    
+    <!-- Font matching rules -->
+    <match target="pattern">
+        <test name="family" qual="any">
+            <string>AvenirNextCondensed-Bold</string>
+        </test>
+        <edit name="family" mode="assign" binding="strong">
+            <string>Avenir Next Condensed</string>
+        </edit>
+        <edit name="weight" mode="assign" binding="strong">
+            <const>bold</const>
+        </edit>
+    </match>
+    
+    <match target="pattern">
+        <test name="family" qual="any">
+            <string>AvenirNextCondensed-DemiBold</string>
+        </test>
+        <edit name="family" mode="assign" binding="strong">
+            <string>Avenir Next Condensed Demi Bold</string>
+        </edit>
+    </match>
+    
+    <match target="pattern">
+        <test name="family" qual="any">
+            <string>AvenirNextCondensed-UltraLight</string>
+        </test>
+        <edit name="family" mode="assign" binding="strong">
+            <string>Avenir Next Condensed Ultra Light</string>
+        </edit>
+    </match>
+</fontconfig>
+'''
+    
+    try:
+        with open(fonts_conf_path, 'w') as f:
+            f.write(fonts_conf_content)
+    except Exception:
+        pass  # Ignore if we can't write the file
+    
+    # Set fontconfig environment variables
+    os.environ['FONTCONFIG_FILE'] = fonts_conf_path
+    os.environ['FONTCONFIG_PATH'] = font_dir
+    
+    # Force fontconfig cache rebuild to pick up new fonts
+    try:
+        cache_dir = '/tmp/fontconfig-cache'
+        os.makedirs(cache_dir, exist_ok=True)
+        # Run fc-cache to build font cache (silently)
+        subprocess.run(['fc-cache', '-f', font_dir], 
+                      capture_output=True, timeout=30)
+    except Exception:
+        pass  # fc-cache may not be available
+
+# Configure fonts before importing cairosvg
+_configure_fontconfig()
+
+# Try to import cairosvg for PDF conversion
+try:
+    import cairosvg
+    HAS_CAIROSVG = True
+except ImportError:
+    HAS_CAIROSVG = False
+
+MAX_MATERIAL_LINES = 15
+
+# Code, materials, REG. No, PER. No, Firm, Origin
+LABEL_COLUMN_COUNT = 6
+
+# Any character outside ASCII, except a few common symbols, is treated as
+# non-English input (this also covers full-width CJK punctuation)
+NON_ENGLISH_PATTERN = r"[^\x00-\x7f°±×÷®™©]"
+_NON_ENGLISH_RE = re.compile(NON_ENGLISH_PATTERN)
+
+# Characters not allowed in generated filenames, and spaces to underscores
+_SANITIZE_RE = re.compile(r'[<>:"/\\|?*\n\r]')
+_SPACE_TRANS = str.maketrans({' ': '_'})
+
+# Origin country codes expanded on the label
+_ORIGIN_MAP = {'CN': 'CHINA', 'VN': 'VIETNAM'}
+
+# Placeholders filled in by replace_template_variables
+_PLACEHOLDER_RE = re.compile(r"\{\{(code_number|material_text|firm|origin_country)\}\}")
+
+
+def create_centered_tspan_elements(text: str, line_height: float = 15.99) -> str:
+    """
+    Create tspan elements from multi-line text with each line horizontally centered.
+    
+    Args:
+        text: Multi-line text to convert (can use \\n or actual newlines)
+        line_height: Height between lines
+        
+    Returns:
+        String containing tspan elements
+    """
+    lines = text.replace('\\n', '\n').split('\n')
+    
+    # Empty lines emit nothing but still take up a line slot
+    return ''.join(
+        f'<tspan x="0" y="{i * line_height:.2f}">{_xml_escape(line_content)}</tspan>'
+        for i, line_content in enumerate(line.strip() for line in lines)
+        if line_content
+    )
+
+
+def split_template(template_content: str) -> Tuple[str, ...]:
+    """
+    Split SVG template content on its {{placeholder}} markers.
+    
+    Returns:
+        Tuple alternating literal segments (even positions) and placeholder
+        names (odd positions), ready for replace_template_variables
+    """
+    return tuple(_PLACEHOLDER_RE.split(template_content))
+
+
+def _template_values(material_text: str, reg_number: str, per_number: str = "", firm: str = "", origin: str = "") -> Dict[str, str]:
+    """Build the placeholder values for one label (see replace_template_variables)."""
+    # User text is escaped so &, < and > cannot break the SVG markup
+    # Handle code_number (REG + optional PER)
+    formatted_reg_no = f"REG.NO.{_xml_escape(reg_number)}"
+    
+    # Check if per_number has a valid value (not empty, not just spaces)
+    per_number_clean = per_number.strip() if per_number else ""
+    
+    if per_number_clean:
+        # Two rows: REG.NO. on first line, PER.NO. on second line
+        # Use tspan elements with y offsets to center both lines as a whole
+        # Line height approximately 16px, so offset each line by half to center
+        formatted_per_no = f"PER.NO.{_xml_escape(per_number_clean)}"
+        code_number_content = f'<tspan x="0" dy="-8">{formatted_reg_no}</tspan><tspan x="0" dy="16">{formatted_per_no}</tspan>'
+    else:
+        # Single row: just REG.NO.
+        code_number_content = formatted_reg_no
+    
+    material_tspans = create_centered_tspan_elements(material_text, line_height=15.99)
+    
+    # Handle origin country - map CN to CHINA, VN to VIETNAM
+    origin_clean = origin.strip().upper() if origin else ""
+    origin_country = _ORIGIN_MAP.get(origin_clean, origin_clean)
+    
+    return {
+        'code_number': code_number_content,
+        'material_text': material_tspans,
+        'firm': _xml_escape(firm.strip()) if firm else '',
+        'origin_country': _xml_escape(origin_country),
+    }
+
+
+def replace_template_variables(svg_content: Union[str, Sequence[str]], material_text: str, reg_number: str, per_number: str = "", firm: str = "", origin: str = "") -> str:
+    """
+    Replace template variables in the SVG content.
+    
+    Args:
+        svg_content: Original SVG content, or its split_template() parts
+        material_text: Multi-line material composition text
+        reg_number: Registration number (without REG.NO. prefix)
+        per_number: Optional PER number (without PER.NO. prefix)
+        firm: Firm name
+        origin: Origin country code (CN or VN)
+    """
+    values = _template_values(material_text, reg_number, per_number, firm, origin)
+    
+    # Fill every placeholder in a single pass over the pre-split template:
+    # placeholder names sit at the odd positions and are swapped by slice
+    parts = split_template(svg_content) if isinstance(svg_content, str) else svg_content
+    filled = list(parts)
+    filled[1::2] = [values[name] for name in parts[1::2]]
+    return ''.join(filled)
+
+
+def _encode_template(template_parts: Sequence[str]) -> List[Union[bytes, str]]:
+    """Encode the literal segments of split_template() parts to UTF-8, keeping placeholder names."""
+    encoded = list(template_parts)
+    encoded[0::2] = [part.encode('utf-8') for part in template_parts[0::2]]
+    return encoded
+
+
+def _build_svg_bytes(encoded_parts: Sequence[Union[bytes, str]], material_text: str, reg_number: str, per_number: str = "", firm: str = "", origin: str = "") -> bytes:
+    """Fill an _encode_template() template and return the SVG directly as UTF-8 bytes."""
+    values = _template_values(material_text, reg_number, per_number, firm, origin)
+    filled = list(encoded_parts)
+    filled[1::2] = [values[name].encode('utf-8') for name in encoded_parts[1::2]]
+    return b''.join(filled)
+
+
+def sanitize_filename(text: str) -> str:
+    """Create a safe filename from text."""
+    return _SANITIZE_RE.sub('', text).translate(_SPACE_TRANS)[:50]
+
+
+def contains_non_english_chars(text: str) -> bool:
+    """
+    Check if text contains non-English characters (like Chinese parentheses).
+    Returns True if non-English characters are found.
+    """
+    return _NON_ENGLISH_RE.search(text) is not None
+
+
+def _render_one_svg_to_pdf(svg_bytes: bytes) -> Optional[bytes]:
+    """Convert UTF-8 encoded SVG to PDF bytes (module-level so worker processes can pickle it)."""
+    if not HAS_CAIROSVG:
+        return None
+    try:
+        return cairosvg.svg2pdf(bytestring=svg_bytes)
+    except Exception as e:
+        print(f"PDF conversion failed: {e}")
+        return None
+
+
+def convert_svg_bytes_to_pdf_bytes(svg_content: str) -> Optional[bytes]:
+    """Convert SVG content to PDF bytes in memory."""
+    return _render_one_svg_to_pdf(svg_content.encode('utf-8'))
+
+
+def _pdf_mp_context() -> multiprocessing.context.BaseContext:
+    """
+    Return the start method for PDF workers, fixed rather than platform default.
+    
+    forkserver never forks the (multi-threaded) Streamlit server, and with
+    label_core as its only preload the server imports it once instead of
+    running the caller's main module. Windows only has spawn.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload([__name__])
+    return context
+
+
+_PDF_MP_CONTEXT = _pdf_mp_context()
+
+def _configured_pdf_workers() -> Optional[int]:
+    """Return the LABEL_PDF_WORKERS override, or None when it is unset or invalid."""
+    configured = os.environ.get('LABEL_PDF_WORKERS', '').strip()
+    try:
+        return max(1, int(configured)) if configured else None
+    except ValueError:
+        return None
+
+
+def default_pdf_workers() -> int:
+    """
+    Return the PDF worker count for long-running servers such as the Streamlit app.
+    
+    LABEL_PDF_WORKERS wins when set; otherwise the CPUs this process may use
+    (os.cpu_count() alone reports host cores, not a container's quota).
+    """
+    configured = _configured_pdf_workers()
+    if configured is not None:
+        return configured
+    if hasattr(os, 'process_cpu_count'):
+        return os.process_cpu_count() or 1
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+# Encoded template a PDF worker process fills in, set once by _init_pdf_worker
+_worker_template: Optional[List[Union[bytes, str]]] = None
+
+
+def _init_pdf_worker(encoded_parts: List[Union[bytes, str]]) -> None:
+    """Pool initializer: receive the encoded template once per worker process."""
+    global _worker_template
+    _worker_template = encoded_parts
+
+
+def _render_label(encoded_parts: Sequence[Union[bytes, str]], values: Tuple[str, ...]) -> Optional[bytes]:
+    """
+    Build one label's SVG bytes from its field values and render it to PDF.
+    
+    The SVG only lives for the duration of this call, so a process holds at
+    most one full copy of the template-sized SVG at a time.
+    """
+    return _render_one_svg_to_pdf(_build_svg_bytes(encoded_parts, *values))
+
+
+def _render_label_in_worker(values: Tuple[str, ...]) -> Optional[bytes]:
+    """Render one label inside a worker, using the template from _init_pdf_worker."""
+    return _render_label(_worker_template, values)
+
+
+_pdf_executor: Optional[ProcessPoolExecutor] = None
+_pdf_executor_workers = 0
+_pdf_executor_template: Optional[List[Union[bytes, str]]] = None
+_pdf_executor_lock = threading.Lock()
+
+
+def _get_pdf_executor(workers: int, encoded_parts: List[Union[bytes, str]]) -> ProcessPoolExecutor:
+    """
+    Return the shared PDF worker pool for a template, with room for at least `workers` processes.
+    
+    The pool is started on first use and only replaced when a batch needs
+    more workers or a different template; workers are started on demand,
+    not all up front.
+    """
+    global _pdf_executor, _pdf_executor_workers, _pdf_executor_template
+    with _pdf_executor_lock:
+        if _pdf_executor is not None and (
+            _pdf_executor_workers < workers or _pdf_executor_template != encoded_parts
+        ):
+            _pdf_executor.shutdown(wait=False)
+            _pdf_executor = None
+        if _pdf_executor is None:
+            _pdf_executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=_PDF_MP_CONTEXT,
+                initializer=_init_pdf_worker,
+                initargs=(encoded_parts,),
+            )
+            _pdf_executor_workers = workers
+            _pdf_executor_template = encoded_parts
+        return _pdf_executor
+
+
+def _reset_pdf_executor(executor: ProcessPoolExecutor) -> None:
+    """Discard a broken worker pool so the next batch starts a new one."""
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is executor:
+            _pdf_executor = None
+    executor.shutdown(wait=False)
+
+
+def shutdown_pdf_executor() -> None:
+    """Stop the shared PDF worker processes (also run at interpreter exit)."""
+    global _pdf_executor
+    with _pdf_executor_lock:
+        executor, _pdf_executor = _pdf_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+atexit.register(shutdown_pdf_executor)
+
+
+def _render_labels_to_pdfs(
+    encoded_parts: List[Union[bytes, str]],
+    values_list: List[Tuple[str, ...]],
+    max_workers: int = 1
+) -> List[Optional[bytes]]:
+    """
+    Render a batch of labels to PDF bytes, preserving order.
+    
+    Each label's SVG embeds the whole template (fonts included), so it is
+    built right before rendering and dropped right after; only the small
+    field values are sent to workers, which get the template once. cairosvg
+    parses and draws mostly in Python
+    while holding the GIL, so batches are spread across worker processes
+    rather than threads, at most one per label. With max_workers=1
+    (the default) or a single label everything renders in-process.
+    
+    Workers import the caller's main module, so scripts opting in to a
+    pool should use an ``if __name__ == "__main__":`` guard; otherwise the
+    batch falls back to in-process rendering.
+    """
+    workers = min(max_workers, len(values_list))
+    
+    if workers <= 1:
+        return [_render_label(encoded_parts, values) for values in values_list]
+    
+    executor = _get_pdf_executor(workers, encoded_parts)
+    try:
+        return list(executor.map(
+            _render_label_in_worker,
+            values_list,
+            chunksize=max(1, min(4, len(values_list) // workers)),
+        ))
+    except BrokenProcessPool:
+        # A worker died (e.g. the caller's script has no __main__ guard, so
+        # workers can't start): start a fresh pool next time and render
+        # this batch in-process instead
+        _reset_pdf_executor(executor)
+        print("PDF worker pool failed; rendering labels in-process")
+        return [_render_label(encoded_parts, values) for values in values_list]
+
+
+def read_label_data(source) -> pd.DataFrame:
+    """
+    Read label data from an Excel file.
+    
+    Only the label columns are kept, and every cell is read as a nullable
+    string so missing cells come back as NA instead of NaN.
+    
+    Args:
+        source: Path or file-like object of the .xlsx file
+    """
+    return pd.read_excel(source, dtype="string").iloc[:, :LABEL_COLUMN_COUNT]
+
+
+def _text_column(df: pd.DataFrame, position: int) -> pd.Series:
+    """Return the column at the given position as strings, with missing cells as ''."""
+    if position >= df.shape[1]:
+        return pd.Series("", index=df.index, dtype="string")
+    return df.iloc[:, position].astype("string").fillna("")
+
+
+def _prepare_label_rows(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Validate all rows at once and return the ones that can be rendered.
+    
+    Columns are read by position: code, materials, REG. No, then the optional
+    PER. No, Firm and Origin columns.
+    
+    Returns:
+        Tuple of (rows, warnings) where:
+        - rows: DataFrame of valid rows with identifier, materials, reg_no,
+          per_no, firm and origin string columns
+        - warnings: list of warning messages for skipped entries
+    """
+    codes = df.iloc[:, 0].astype("string")
+    identifiers = pd.Series(
+        np.where(codes.isna(), "label_" + df.index.astype(str), codes.fillna("")),
+        index=df.index,
+        dtype="string",
+    )
+    materials = _text_column(df, 1)
+    reg_nos = _text_column(df, 2)
+    per_nos = _text_column(df, 3)
+    
+    # Rows without materials or REG. No are skipped silently
+    has_data = ((materials != "") & (reg_nos != "")).to_numpy(dtype=bool)
+    reasons = np.full(len(df), "", dtype=object)
+    
+    # Count non-empty material lines (handle both \\n and actual newlines)
+    line_counts = materials[has_data].str.replace('\\n', '\n', regex=False).str.split('\n').map(
+        lambda lines: sum(1 for line in lines if line.strip())
+    ).to_numpy(dtype=int)
+    too_long = np.zeros(len(df), dtype=bool)
+    too_long[has_data] = line_counts > MAX_MATERIAL_LINES
+    reasons[too_long] = f"material text larger than {MAX_MATERIAL_LINES} lines."
+    
+    def non_english(column: pd.Series) -> np.ndarray:
+        return column.str.contains(NON_ENGLISH_PATTERN, regex=True).to_numpy(dtype=bool)
+    
+    # Only rows that passed the cheap checks get the Unicode scan, done once
+    # over all three fields joined by an ASCII separator
+    candidates = np.flatnonzero(has_data & ~too_long)
+    combined = materials.iloc[candidates] + "\x01" + reg_nos.iloc[candidates] + "\x01" + per_nos.iloc[candidates]
+    bad = candidates[non_english(combined)]
+    
+    # Re-scan the failing rows field by field to report which one was bad
+    if len(bad):
+        reasons[bad] = np.select(
+            [non_english(materials.iloc[bad]), non_english(reg_nos.iloc[bad])],
+            ["material text is not English input.", "REG # is not English input."],
+            default="PER # is not English input.",
+        )
+    
+    rejected = reasons != ""
+    warnings = (identifiers[rejected] + " label is not generated, reason: " + reasons[rejected]).tolist()
+    
+    rows = pd.DataFrame({
+        "identifier": identifiers,
+        "materials": materials,
+        "reg_no": reg_nos,
+        "per_no": per_nos,
+        "firm": _text_column(df, 4),
+        "origin": _text_column(df, 5),
+    })
+    return rows.loc[has_data & ~rejected], warnings
+
+
+def generate_from_dataframe(
+    template_content: Union[str, Sequence[str]], 
+    df: pd.DataFrame, 
+    label_name: str,
+    pdf_workers: Optional[int] = None
+) -> Tuple[List[Tuple[str, bytes]], List[str]]:
+    """
+    Generate PDF labels from a DataFrame (in-memory, no file I/O).
+    
+    Args:
+        template_content: SVG template content as string, or its split_template() parts
+        df: DataFrame with label data
+        label_name: Suffix for the PDF filenames ({default_code}-{label_name}.pdf)
+        pdf_workers: Worker processes for PDF rendering. Defaults to
+            LABEL_PDF_WORKERS, else 1 (in-process); servers can pass
+            default_pdf_workers() to opt in to a pool
+        
+    Returns:
+        Tuple of (pdf_files, warnings) where:
+        - pdf_files: list of (filename, content) tuples
+        - warnings: list of warning messages for skipped entries
+    """
+    # Nothing can be produced without cairosvg, so skip all template work
+    if not HAS_CAIROSVG:
+        return [], ["cairosvg unavailable; no PDFs generated."]
+    
+    rows, warnings = _prepare_label_rows(df)
+    
+    if isinstance(template_content, str):
+        template_content = split_template(template_content)
+    
+    # Encode the template once; each label is then assembled directly as
+    # UTF-8 bytes instead of building a str and encoding the whole SVG again
+    encoded_parts = _encode_template(template_content)
+    
+    pdf_filenames = []
+    row_values = []
+    for identifier, materials_text, reg_no, per_no, firm, origin in rows.itertuples(index=False, name=None):
+        row_values.append((materials_text, reg_no, per_no, firm, origin))
+        
+        # Generate PDF with naming pattern: {default_code}-{label_name}.pdf
+        safe_name = sanitize_filename(identifier)
+        pdf_filenames.append(f"{safe_name}-{label_name}.pdf")
+    
+    if pdf_workers is None:
+        pdf_workers = _configured_pdf_workers() or 1
+    
+    # The SVG depends only on these fields, so render each distinct row once
+    unique_values = list(dict.fromkeys(row_values))
+    pdf_cache = dict(zip(unique_values, _render_labels_to_pdfs(encoded_parts, unique_values, pdf_workers)))
+    
+    pdf_files = [
+        (pdf_filename, pdf_cache[values])
+        for pdf_filename, values in zip(pdf_filenames, row_values)
+        if pdf_cache[values]
+    ]
+    
+    return pdf_files, warnings